@@ -1,78 +1,182 @@
 import streamlit as st
+import gzip
 import json
+import math
+import pickle
+import zlib
+from pathlib import Path
+import orjson
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, Any, Tuple
 
-@st.cache_data
-def load_data() -> Dict[str, Any]:
-    """Load and cache the JSON data."""
-    with open('final_results.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+RESULTS_PATH = Path('final_results.json')
+# Gzipped results, read when RESULTS_PATH itself is not present
+RESULTS_GZ_PATH = Path('final_results.json.gz')
+# Parsed copy of the results file, reused while that file is unchanged
+RESULTS_CACHE_PATH = Path('final_results.cache.pkl')
+KEY_COLUMNS = ['model_name', 'dataset', 'problem_id']
+# Record fields the views display; the rest (prompt, model_path, ...) is not kept in memory
+RECORD_COLUMNS = [
+    'question', 'true_answer', 'predicted_answer', 'model_response', 'is_correct',
+    'eval_aspect', 'gpt4_score',
+]
+# GPT4 score thresholds (0-5 scale); a score at or above SCORE_THRESHOLDS[i] gets SCORE_COLORS[i + 1]
+SCORE_THRESHOLDS = [1.5, 2.5, 3.5, 4.5]
+SCORE_COLORS = [
+    "#FF0000",  # Red
+    "#FF7F00",  # Orange
+    "#FFFF00",  # Yellow
+    "#7FFF00",  # Light green
+    "#00FF00",  # Green
+]
 
-def get_model_names(data: Dict[str, Any]) -> List[str]:
-    """Extract unique model names from the data and sort them properly."""
-    model_names = set()
-    for record in data.get('detailed_results', []):
-        model_names.add(record['model_name'])
-    
-    # Custom sorting: base_model first, then checkpoint numbers in ascending order
-    model_list = list(model_names)
-    
-    def sort_key(model_name):
-        if model_name == 'base_model':
-            return (0, 0)  # base_model comes first
-        elif model_name.startswith('checkpoint_'):
-            try:
-                # Extract number from checkpoint_XXX
-                number = int(model_name.split('_')[1])
-                return (1, number)  # checkpoints come after base_model, sorted by number
-            except (IndexError, ValueError):
-                return (2, model_name)  # fallback for unexpected format
-        else:
-            return (2, model_name)  # other models come last, sorted alphabetically
-    
-    return sorted(model_list, key=sort_key)
+# Custom CSS for better styling, kept in static/app.css and read once at import
+_CSS = f"<style>\n{(Path(__file__).parent / 'static' / 'app.css').read_text(encoding='utf-8')}</style>"
+
+# Main header with enhanced styling
+_HEADER = """
+<div class="main-header">
+    <h1 style="margin: 0; font-size: 2.5rem;">🚀 AI Model Battle Arena</h1>
+    <p style="margin: 0.5rem 0 0 0; font-size: 1.2rem; opacity: 0.9;">AIモデル対戦アリーナ - 次世代モデル評価プラットフォーム</p>
+    <p style="margin: 0.3rem 0 0 0; font-size: 0.9rem; opacity: 0.8;">⚡ 最先端AIモデルの性能を直接対決で比較する革新的システム ⚡</p>
+</div>
+"""
+
+def get_results_path() -> Path:
+    """Return the results file to read: final_results.json, or else its gzipped copy."""
+    if RESULTS_PATH.exists() or not RESULTS_GZ_PATH.exists():
+        return RESULTS_PATH
+    return RESULTS_GZ_PATH
+
+def load_data(path: Path) -> Dict[str, Any]:
+    """Load the JSON data, using the pickled sidecar when it is up to date."""
+    # Not cached itself: only load_table() reads it, and st.cache_data would keep
+    # a second, pickled copy of every record next to the cached table
+    # The sidecar records which file (and which version of it) it was parsed from
+    source = (str(path), path.stat().st_mtime)
+    try:
+        cached_source, cached_data = pickle.loads(RESULTS_CACHE_PATH.read_bytes())
+        if cached_source == source:
+            return cached_data
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        pass  # missing, truncated or old-format sidecar; rebuild it below
+    
+    raw = path.read_bytes()
+    if path.suffix == '.gz':
+        raw = gzip.decompress(raw)
+    data = orjson.loads(raw)
+    try:
+        RESULTS_CACHE_PATH.write_bytes(pickle.dumps((source, data), protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        pass  # the sidecar is only an optimization; keep going without it
+    return data
+
+def _model_sort_key(model_name: str) -> tuple:
+    """Sort key: base_model first, then checkpoint numbers in ascending order."""
+    if model_name == 'base_model':
+        return (0, 0)  # base_model comes first
+    elif model_name.startswith('checkpoint_'):
+        try:
+            # Extract number from checkpoint_XXX
+            number = int(model_name.split('_')[1])
+            return (1, number)  # checkpoints come after base_model, sorted by number
+        except (IndexError, ValueError):
+            return (2, model_name)  # fallback for unexpected format
+    else:
+        return (2, model_name)  # other models come last, sorted alphabetically
+
+@st.cache_resource(max_entries=1)
+def load_table(path: Path, mtime: float) -> pd.DataFrame:
+    """Build the results table, one row per record.
 
-def get_datasets(data: Dict[str, Any]) -> List[str]:
-    """Extract unique dataset names from the data."""
-    datasets = set()
-    for record in data.get('detailed_results', []):
-        datasets.add(record['dataset'])
-    return sorted(list(datasets))
+    Args:
+        path: Results file to read, as returned by get_results_path().
+        mtime: Modification time of `path`, used only as the cache key so that
+            a replaced results file is picked up without clearing the cache.
+    """
+    df = pd.DataFrame(load_data(path).get('detailed_results', []), columns=KEY_COLUMNS + RECORD_COLUMNS)
+    # Keep integer scores integral despite the rows that have no score; fractional
+    # scores (e.g. 3.5) stay float
+    if df['gpt4_score'].dropna().mod(1).eq(0).all():
+        df['gpt4_score'] = df['gpt4_score'].astype('Int64')
+    _fill_is_correct(df)
+    # Precompute the score color once instead of on every render; missing scores show as 0
+    df['score_color'] = pd.cut(
+        df['gpt4_score'].fillna(0).astype(float),
+        bins=[-math.inf, *SCORE_THRESHOLDS, math.inf],
+        labels=SCORE_COLORS,
+        right=False,
+    ).astype(str)
+    return df
 
-def get_problem_ids(data: Dict[str, Any]) -> List[int]:
-    """Extract unique problem IDs from the data."""
-    problem_ids = set()
-    for record in data.get('detailed_results', []):
-        problem_ids.add(record['problem_id'])
-    return sorted(list(problem_ids))
+def _fill_is_correct(df: pd.DataFrame) -> None:
+    """Calculate is_correct in place for non-elyza rows where it is not present in data."""
+    missing = df['is_correct'].isna() & (df['dataset'] != 'elyza')
+    if not missing.any():
+        return
+    
+    predicted = df.loc[missing, 'predicted_answer']
+    true = df.loc[missing, 'true_answer']
+    # Compare numerically when both sides parse as numbers, as strings otherwise
+    predicted_num = pd.to_numeric(predicted, errors='coerce')
+    true_num = pd.to_numeric(true, errors='coerce')
+    num_eq = predicted_num == true_num
+    str_eq = predicted.map(str).str.strip() == true.map(str).str.strip()
+    df['is_correct'] = df['is_correct'].astype(object)
+    df.loc[missing, 'is_correct'] = num_eq.where(predicted_num.notna() & true_num.notna(), str_eq)
 
-def filter_records(data: Dict[str, Any], model1: str, model2: str, dataset: str, problem_id: int) -> tuple:
+@st.cache_data(max_entries=1)
+def get_options(_table: pd.DataFrame, mtime: float) -> Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[int, ...]]:
+    """Extract sorted model names, datasets and problem IDs from the table."""
+    # `_table` is not hashed by Streamlit; `mtime` ties the entry to load_table(mtime)
+    # Dedup and sort stay in pandas; only the model names need a Python-level sort key
+    return (
+        tuple(sorted(_table['model_name'].unique().tolist(), key=_model_sort_key)),
+        tuple(_table['dataset'].drop_duplicates().sort_values().tolist()),
+        tuple(_table['problem_id'].drop_duplicates().sort_values().tolist()),
+    )
+
+@st.cache_resource(max_entries=1)
+def build_index(_table: pd.DataFrame, mtime: float) -> Dict[Tuple[str, str, int], int]:
+    """Build a (model_name, dataset, problem_id) -> row position lookup table."""
+    # `_table` is not hashed by Streamlit; `mtime` ties the entry to load_table(mtime)
+    keys = zip(*(_table[column].tolist() for column in KEY_COLUMNS))
+    return {key: position for position, key in enumerate(keys)}
+
+def _row_to_record(row: pd.Series) -> Dict[str, Any]:
+    """Convert a table row back to a record, dropping the fields it did not have."""
+    return {
+        key: value for key, value in row.items()
+        if not (value is pd.NA or (isinstance(value, float) and math.isnan(value)))
+    }
+
+def filter_records(table: pd.DataFrame, index: Dict[Tuple[str, str, int], int], model1: str, model2: str, dataset: str, problem_id: int) -> tuple:
     """Filter records based on selection criteria."""
-    records = data.get('detailed_results', [])
-    
-    record1 = None
-    record2 = None
-    
-    for record in records:
-        if (record['model_name'] == model1 and 
-            record['dataset'] == dataset and 
-            record['problem_id'] == problem_id):
-            record1 = record
-        elif (record['model_name'] == model2 and 
-              record['dataset'] == dataset and 
-              record['problem_id'] == problem_id):
-            record2 = record
-    
-    return record1, record2
+    records = []
+    for model in (model1, model2):
+        position = index.get((model, dataset, problem_id))
+        records.append(None if position is None else _row_to_record(table.iloc[position]))
+    return tuple(records)
 
-def calculate_is_correct(predicted_answer: Any, true_answer: Any) -> bool:
-    """Calculate is_correct if not present in data."""
-    try:
-        return float(predicted_answer) == float(true_answer)
-    except (ValueError, TypeError):
-        return str(predicted_answer).strip() == str(true_answer).strip()
+def _as_text(value: Any) -> str:
+    """Return `value` as display text without copying values that are already strings."""
+    if isinstance(value, str):
+        return value
+    return 'N/A' if value is None else str(value)
+
+def show_text_area(key: str, value: Any, **kwargs: Any) -> None:
+    """Render a text area under a stable key, refreshing its content when `value` changes."""
+    value = _as_text(value)
+    # Keyed widgets keep their state across reruns, so a changed `value=` alone would
+    # not show up; push it into session_state instead (this also keeps user edits
+    # until the displayed record changes)
+    source_key = f"{key}_source"
+    if key not in st.session_state or st.session_state.get(source_key) != value:
+        st.session_state[source_key] = value
+        st.session_state[key] = value
+    st.text_area("", key=key, **kwargs)
 
+@st.fragment
 def render_normal_view(record1: Dict[str, Any], record2: Dict[str, Any], model1: str, model2: str):
     """Render the normal view for non-elyza datasets."""
     st.subheader("比較結果")
@@ -85,7 +189,7 @@ def render_normal_view(record1: Dict[str, Any], record2: Dict[str, Any], model1:
     st.write("**True Answer:**")
     dataset = record1.get('dataset', '')
     true_answer_height = 450 if dataset == 'custom' else 70
-    st.text_area("", value=str(record1.get('true_answer', 'N/A')), height=true_answer_height, key="true_answer", disabled=True)
+    show_text_area("true_answer", record1.get('true_answer', 'N/A'), height=true_answer_height, disabled=True)
     
     # Create two columns for model comparison
     col1, col2 = st.columns(2)
@@ -95,43 +199,36 @@ def render_normal_view(record1: Dict[str, Any], record2: Dict[str, Any], model1:
         
         # Predicted Answer
         st.write("**Predicted Answer:**")
-        st.text_area("", value=str(record1.get('predicted_answer', 'N/A')), height=70, key=f"predicted1_{model1}", disabled=True)
+        show_text_area("predicted1", record1.get('predicted_answer', 'N/A'), height=70, disabled=True)
         
         # Is Correct
-        is_correct1 = record1.get('is_correct')
-        if is_correct1 is None:
-            is_correct1 = calculate_is_correct(record1['predicted_answer'], record1['true_answer'])
-        
-        if is_correct1:
+        if record1.get('is_correct'):
             st.success("✅ Correct")
         else:
             st.error("❌ Incorrect")
         
         # Model Response
         st.write("**Model Response:**")
-        st.text_area("", value=record1.get('model_response', 'N/A'), height=600, key=f"response1_{model1}")
+        show_text_area("response1", record1.get('model_response', 'N/A'), height=600)
     
     with col2:
         st.markdown(f"## {model2}")
         
         # Predicted Answer
         st.write("**Predicted Answer:**")
-        st.text_area("", value=str(record2.get('predicted_answer', 'N/A')), height=70, key=f"predicted2_{model2}", disabled=True)
+        show_text_area("predicted2", record2.get('predicted_answer', 'N/A'), height=70, disabled=True)
         
         # Is Correct
-        is_correct2 = record2.get('is_correct')
-        if is_correct2 is None:
-            is_correct2 = calculate_is_correct(record2['predicted_answer'], record2['true_answer'])
-        
-        if is_correct2:
+        if record2.get('is_correct'):
             st.success("✅ Correct")
         else:
             st.error("❌ Incorrect")
         
         # Model Response
         st.write("**Model Response:**")
-        st.text_area("", value=record2.get('model_response', 'N/A'), height=600, key=f"response2_{model2}")
+        show_text_area("response2", record2.get('model_response', 'N/A'), height=600)
 
+@st.fragment
 def render_elyza_view(record1: Dict[str, Any], record2: Dict[str, Any], model1: str, model2: str):
     """Render the elyza view for elyza dataset."""
     st.subheader("比較結果 (ELYZA)")
@@ -152,37 +249,24 @@ def render_elyza_view(record1: Dict[str, Any], record2: Dict[str, Any], model1:
         
         # GPT4 Score
         score1 = record1.get('gpt4_score', 0)
-        score_color1 = get_score_color(score1)
+        score_color1 = record1['score_color']
         st.markdown(f"**GPT4 Score:** <span style='color: {score_color1}; font-weight: bold;'>{score1}/5</span>", unsafe_allow_html=True)
         
         # Model Response
         st.write("**Model Response:**")
-        st.text_area("", value=record1.get('model_response', 'N/A'), height=600, key=f"elyza_response1_{model1}")
+        show_text_area("elyza_response1", record1.get('model_response', 'N/A'), height=600)
     
     with col2:
         st.markdown(f"## {model2}")
         
         # GPT4 Score
         score2 = record2.get('gpt4_score', 0)
-        score_color2 = get_score_color(score2)
+        score_color2 = record2['score_color']
         st.markdown(f"**GPT4 Score:** <span style='color: {score_color2}; font-weight: bold;'>{score2}/5</span>", unsafe_allow_html=True)
         
         # Model Response
         st.write("**Model Response:**")
-        st.text_area("", value=record2.get('model_response', 'N/A'), height=600, key=f"elyza_response2_{model2}")
-
-def get_score_color(score: float) -> str:
-    """Get color based on score (0-5 scale)."""
-    if score >= 4.5:
-        return "#00FF00"  # Green
-    elif score >= 3.5:
-        return "#7FFF00"  # Light green
-    elif score >= 2.5:
-        return "#FFFF00"  # Yellow
-    elif score >= 1.5:
-        return "#FF7F00"  # Orange
-    else:
-        return "#FF0000"  # Red
+        show_text_area("elyza_response2", record2.get('model_response', 'N/A'), height=600)
 
 def main():
     st.set_page_config(
@@ -192,222 +276,69 @@ def main():
     )
     
     # Custom CSS for better styling
-    st.markdown("""
-    <style>
-    /* Main container styling */
-    .main > div {
-        padding-top: 2rem;
-    }
-    
-    /* Header styling */
-    .main-header {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        color: white;
-        margin-bottom: 2rem;
-        text-align: center;
-    }
-    
-    /* Selection panel styling */
-    .selection-panel {
-        background-color: #f8f9fa;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        margin-bottom: 2rem;
-    }
-    
-    /* Comparison cards */
-    .comparison-card {
-        background-color: white;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border: 1px solid #e9ecef;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        margin-bottom: 1rem;
-    }
-    
-    /* Model headers */
-    .model-header {
-        background: linear-gradient(135deg, #74b9ff 0%, #0984e3 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 8px;
-        margin-bottom: 1rem;
-        text-align: center;
-        font-weight: bold;
-        font-size: 1.1rem;
-    }
-    
-    /* Question section */
-    .question-section {
-        background-color: #f1f3f4;
-        padding: 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #4285f4;
-        margin-bottom: 2rem;
-    }
-    
-    /* Answer sections */
-    .answer-section {
-        background-color: #fff3cd;
-        padding: 1rem;
-        border-radius: 6px;
-        border-left: 3px solid #ffc107;
-        margin-bottom: 1rem;
-    }
-    
-    /* Status indicators */
-    .status-correct {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 0.5rem 1rem;
-        border-radius: 20px;
-        border: 1px solid #c3e6cb;
-        display: inline-block;
-        font-weight: bold;
-    }
-    
-    .status-incorrect {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 0.5rem 1rem;
-        border-radius: 20px;
-        border: 1px solid #f5c6cb;
-        display: inline-block;
-        font-weight: bold;
-    }
-    
-    /* Score styling */
-    .score-display {
-        background: linear-gradient(135deg, #a8e6cf 0%, #88d8a3 100%);
-        padding: 0.8rem;
-        border-radius: 8px;
-        text-align: center;
-        font-weight: bold;
-        color: #2d3436;
-    }
-    
-    /* Text area styling */
-    .stTextArea > div > div > textarea {
-        border-radius: 8px;
-        border: 2px solid #e9ecef;
-        font-family: 'Consolas', 'Monaco', monospace;
-        font-size: 0.9rem;
-        line-height: 1.4;
-    }
-    
-    .stTextArea > div > div > textarea:focus {
-        border-color: #4285f4;
-        box-shadow: 0 0 0 2px rgba(66, 133, 244, 0.2);
-    }
-    
-    /* Selectbox styling */
-    .stSelectbox > div > div {
-        border-radius: 6px;
-    }
-    
-    /* Divider styling */
-    hr {
-        margin: 2rem 0;
-        border: none;
-        height: 2px;
-        background: linear-gradient(90deg, transparent, #ddd, transparent);
-    }
-    
-    /* Column spacing */
-    .element-container {
-        margin-bottom: 1rem;
-    }
-    
-    /* Sticky selection panel - using direct CSS injection */
-    .stApp > div:first-child > div.sticky-controls {
-        position: sticky !important;
-        top: 0 !important;
-        background-color: white !important;
-        z-index: 999 !important;
-        padding: 1rem 0 !important;
-        border-bottom: 2px solid #e9ecef !important;
-        margin-bottom: 1rem !important;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1) !important;
-    }
-    
-    /* Alternative approach using element targeting */
-    div[data-testid="stSidebar"] + div > div:first-child > div:nth-child(3) {
-        position: sticky !important;
-        top: 0 !important;
-        background-color: white !important;
-        z-index: 999 !important;
-        padding: 1rem 0 !important;
-        border-bottom: 2px solid #e9ecef !important;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1) !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_CSS, unsafe_allow_html=True)
     
     # Main header with enhanced styling
-    st.markdown("""
-    <div class="main-header">
-        <h1 style="margin: 0; font-size: 2.5rem;">🚀 AI Model Battle Arena</h1>
-        <p style="margin: 0.5rem 0 0 0; font-size: 1.2rem; opacity: 0.9;">AIモデル対戦アリーナ - 次世代モデル評価プラットフォーム</p>
-        <p style="margin: 0.3rem 0 0 0; font-size: 0.9rem; opacity: 0.8;">⚡ 最先端AIモデルの性能を直接対決で比較する革新的システム ⚡</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_HEADER, unsafe_allow_html=True)
     
     # Load data
     try:
-        data = load_data()
+        results_path = get_results_path()
+        mtime = results_path.stat().st_mtime
+        table = load_table(results_path, mtime)
     except FileNotFoundError:
-        st.error("final_results.json ファイルが見つかりません。")
+        st.error("final_results.json (または final_results.json.gz) ファイルが見つかりません。")
         st.stop()
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, gzip.BadGzipFile, EOFError, zlib.error):
         st.error("JSON ファイルの読み込みに失敗しました。")
         st.stop()
     
     # Get available options
-    model_names = get_model_names(data)
-    datasets = get_datasets(data)
-    problem_ids = get_problem_ids(data)
+    model_names, datasets, problem_ids = get_options(table, mtime)
+    index = build_index(table, mtime)
     
     # Selection interface with container for sticky positioning
     with st.container():
         st.markdown('<div class="sticky-controls">', unsafe_allow_html=True)
         st.subheader("⚔️ バトル設定")
         
-        col1, col2, col3, col4 = st.columns(4)
-    
-        with col1:
-            model1 = st.selectbox(
-                "Model 1",
-                options=model_names,
-                key="model1",
-                help="比較対象のモデル1を選択"
-            )
+        # Selectors only apply on submit, so changing several of them costs one rerun
+        with st.form("battle_form", border=False):
+            col1, col2, col3, col4 = st.columns(4)
+    
+            with col1:
+                model1 = st.selectbox(
+                    "Model 1",
+                    options=model_names,
+                    key="model1",
+                    help="比較対象のモデル1を選択"
+                )
         
-        with col2:
-            model2 = st.selectbox(
-                "Model 2", 
-                options=model_names,
-                key="model2",
-                help="比較対象のモデル2を選択"
-            )
+            with col2:
+                model2 = st.selectbox(
+                    "Model 2", 
+                    options=model_names,
+                    key="model2",
+                    help="比較対象のモデル2を選択"
+                )
         
-        with col3:
-            dataset = st.selectbox(
-                "Dataset",
-                options=datasets,
-                key="dataset",
-                help="評価データセットを選択"
-            )
+            with col3:
+                dataset = st.selectbox(
+                    "Dataset",
+                    options=datasets,
+                    key="dataset",
+                    help="評価データセットを選択"
+                )
         
-        with col4:
-            problem_id = st.selectbox(
-                "Problem ID",
-                options=problem_ids,
-                key="problem_id",
-                help="問題IDを選択 (0-49)"
-            )
+            with col4:
+                problem_id = st.selectbox(
+                    "Problem ID",
+                    options=problem_ids,
+                    key="problem_id",
+                    help="問題IDを選択 (0-49)"
+                )
+            
+            st.form_submit_button("⚔️ Compare")
         
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -419,7 +350,7 @@ def main():
         if model1 == model2:
             st.error("同じモデルが選択されています。違うモデルを選んでください。")
         else:
-            record1, record2 = filter_records(data, model1, model2, dataset, problem_id)
+            record1, record2 = filter_records(table, index, model1, model2, dataset, problem_id)
             
             if record1 is None or record2 is None:
                 st.error("該当するデータが見つかりません。条件を確認してください。")